@@ -0,0 +1,21 @@
+"""Load the zslurm manager script as a module for the benchmarks in bench/."""
+import importlib.machinery
+import importlib.util
+import io
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_zslurm():
+    """A fresh in-process zslurm module, logging into a StringIO."""
+    loader = importlib.machinery.SourceFileLoader("zslurm_bench", os.path.join(ROOT, "zslurm"))
+    spec = importlib.util.spec_from_loader("zslurm_bench", loader)
+    mod = importlib.util.module_from_spec(spec)
+    loader.exec_module(mod)
+    mod.gb.lock = threading.RLock()
+    mod.gb.log_file = io.StringIO()
+    return mod
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Manager memory of a large queue, with and without interned environments.
+
+Fills an in-process zslurm manager with --jobs pending jobs that all carry the
+same --env-kb environment, each submit unmarshalling its own copy of it (as
+XML-RPC/JSON do). Runs three ways: every job keeping its own copy (the old
+behaviour, interning disabled), environments interned by content (EnvStore),
+and zsbatch's way of sending a diff against an env_base uploaded once with
+put_env. Reports the memory traced while filling the queue and the size of
+one request_jobs reply with and without env_cache.
+
+    python bench/env_memory.py [--jobs 100000] [--env-kb 12]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+import xmlrpc.client
+
+from _zslurm import load_zslurm
+
+
+def make_env(kb):
+    # PATH-like module/conda variables of ~100 bytes each
+    env = {}
+    i = 0
+    while sum(len(k) + len(v) for k, v in env.items()) < kb * 1024:
+        env["BENCH_VAR_%03d" % i] = "/opt/conda/envs/bench/lib/python3.11/site-packages/pkg%03d:" % i * 2
+        i += 1
+    return env
+
+
+def fill(z, mode, env, njobs, chunk=1000):
+    base_key = z.jobs.put_env(env) if mode == "diff" else None
+    if mode == "copies":
+        z.jobs.envs.intern = lambda e: (None, e)
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    for first in range(0, njobs, chunk):
+        specs = []
+        for i in range(first, min(njobs, first + chunk)):
+            spec = dict(job_name="snakejob.bench.%d.sh" % i, cmd="true", cwd="/", ncpu=1, mem=1000, reqtime=60)
+            if mode == "diff":
+                spec.update(env={}, env_base=base_key)
+            else:
+                # what unmarshalling a full env yields: new strings for every job
+                spec.update(env=dict((k.encode().decode(), v.encode().decode()) for k, v in env.items()))
+            specs.append(spec)
+        z.jobs.submit_jobs(specs)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return used, elapsed
+
+
+def reply_bytes(z, env_cache):
+    myid = z.engines.register("bench-engine-%d" % env_cache, 16, 64000, "compute", "", 0, 0)
+    reply = z.jobs.request_jobs(myid, 16, 64000, "compute", env_cache)
+    return len(xmlrpc.client.dumps((reply,), methodresponse=True, allow_none=True)), len(reply)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100000, help="pending jobs in the queue")
+    parser.add_argument("--env-kb", type=float, default=12, help="size of the job environment")
+    args = parser.parse_args()
+
+    env = make_env(args.env_kb)
+    print("%d pending jobs, environment of %d variables (%.1f KB)" % (
+        args.jobs, len(env), sum(len(k) + len(v) for k, v in env.items()) / 1024.0))
+    print("%-10s %12s %12s %12s" % ("mode", "traced MB", "bytes/job", "submit s*"))
+    for mode in ("copies", "interned", "diff"):
+        z = load_zslurm()
+        used, elapsed = fill(z, mode, env, args.jobs)
+        print("%-10s %12.1f %12.0f %12.2f" % (mode, used / 1e6, used / float(args.jobs), elapsed))
+        if mode == "diff":
+            for env_cache in (False, True):
+                size, n = reply_bytes(z, env_cache)
+                print("request_jobs reply, env_cache=%-5s %8d bytes for %d jobs" % (env_cache, size, n))
+        del z
+        gc.collect()
+    print("* under tracemalloc, which slows allocation-heavy code several times")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Rank one packing window with every fit scorer and check the walltime one.
+
+Builds a FitWindow of jobs with different shapes and requested walltimes for
+an engine with --timeleft seconds left and prints, per scorer, the order in
+which the jobs would be started. Then checks that score_walltime sees a job
+asking for (about) the engine's whole remaining time as leaving nothing
+unused, and a job asking for a tenth of it as leaving 90% unused.
+
+    python bench/fit_scorers.py [--timeleft 3600]
+"""
+import argparse
+
+import numpy
+
+from _zslurm import load_zslurm
+
+
+def window(z, shapes):
+    w = z.FitWindow()
+    for i, (ncpu, mem, reqtime) in enumerate(shapes):
+        job = z.Job("job%d" % i, str(i), "true", "/", {}, ncpu, mem, reqtime, 0, "", 0, 0, 0, 0, 0, 0,
+                    "compute", 0, "", "", "no", 0, "bench", 0)
+        w.append(job)
+    return w
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--timeleft", type=float, default=3600.0, help="engine walltime left, in seconds")
+    args = parser.parse_args()
+
+    z = load_zslurm()
+    minutes = args.timeleft / z.REQTIME_UNIT_SEC
+    # (ncpu, mem MB, reqtime in minutes, as zsbatch submits it)
+    shapes = [(4, 8000, minutes), (4, 8000, minutes / 10), (8, 16000, minutes / 2), (2, 4000, minutes * 0.95),
+              (1, 2000, 1)]
+    node = {'cores': 16, 'totmem': 64000, 'timeleft': args.timeleft, 'average_mem_core': 4000.0,
+            'has_ssd': False, 'ssd_free_gb': 0.0, 'ssd_bonus': 0.0}
+    w = window(z, shapes)
+    cols = dict((name, col[:len(w)]) for name, col in w.cols.items())
+    print("engine: 16 cores, 64000 MB, %.0f s left" % args.timeleft)
+    for name, scorer in z.FIT_SCORERS.items():
+        scores = scorer(cols, 16.0, 64000.0, node)
+        print("%-10s %s" % (name, " ".join("%d:%.0fmin" % (shapes[i][0], shapes[i][2]) for i in numpy.argsort(scores, kind="stable"))))
+
+    unused = z.score_walltime(cols, 16.0, 64000.0, node) - z.score_memfit(cols, 16.0, 64000.0, node)
+    assert abs(unused[0]) < 1e-9, "job needing all remaining walltime leaves %.3f unused" % unused[0]
+    assert abs(unused[3] - 0.05) < 1e-6, unused[3]
+    assert abs(unused[1] - 0.9) < 1e-6, unused[1]
+    print("walltime unused term: %s (ok)" % " ".join("%.2f" % u for u in unused))
+
+
+if __name__ == "__main__":
+    main()
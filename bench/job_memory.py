@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Manager memory per queued job, GC pause and request_jobs latency by queue size.
+
+For each --sizes queue size, fills an in-process zslurm manager with that many
+pending jobs (submit_jobs in chunks, names/cwd/owner/partition unmarshalled
+fresh for every job as XML-RPC/JSON do) and reports the memory traced while
+filling it per job, the size of one Job object, the time of a full
+gc.collect(), and the median/p99 latency of request_jobs for a 16-core engine
+(each round's jobs are finished before the next round).
+
+    python bench/job_memory.py [--sizes 10000,100000,1000000] [--rounds 200]
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from _zslurm import load_zslurm
+
+
+def fresh(text):
+    # a new string object with the same value, like unmarshalling yields
+    return text.encode().decode()
+
+
+def fill(z, njobs, chunk=1000):
+    for first in range(0, njobs, chunk):
+        specs = []
+        for i in range(first, min(njobs, first + chunk)):
+            specs.append(dict(
+                job_name="snakejob.rule%d.%d.sh" % (i % 40, i), cmd="/bin/sh snakejob.rule%d.%d.sh" % (i % 40, i),
+                cwd=fresh("/scratch/project/cohort/run"), env={}, ncpu=1 + i % 4, mem=1000.0 + i % 7 * 500,
+                reqtime=60, partition=fresh("compute"), owner=fresh("run-3f2c9a"), comment=fresh("")))
+        z.jobs.submit_jobs(specs)
+
+
+def object_bytes(job):
+    size = sys.getsizeof(job)
+    if hasattr(job, "__dict__"):
+        size += sys.getsizeof(job.__dict__)
+    return size
+
+
+def request_latency(z, rounds):
+    myid = z.engines.register("bench-engine", 16, 64000, "compute", "", 0, 0)
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        got = z.jobs.request_jobs(myid, 16, 64000, "compute")
+        times.append(time.perf_counter() - t0)
+        for job in got:
+            z.jobs.job_finished(myid, job[0], 0, {})
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated queue sizes")
+    parser.add_argument("--rounds", type=int, default=200, help="request_jobs calls per size")
+    args = parser.parse_args()
+
+    print("%10s %12s %12s %10s %14s %14s" % ("jobs", "bytes/job", "Job object", "gc ms", "request ms p50", "request ms p99"))
+    for njobs in [int(size) for size in args.sizes.split(",")]:
+        z = load_zslurm()
+        gc.collect()
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        fill(z, njobs)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        one = object_bytes(next(iter(z.jobs.jobs_by_id.values())))
+        t0 = time.perf_counter()
+        gc.collect()
+        pause = time.perf_counter() - t0
+        p50, p99 = request_latency(z, args.rounds)
+        print("%10d %12.0f %12d %10.1f %14.3f %14.3f" % (njobs, used / float(njobs), one, pause * 1e3, p50 * 1e3, p99 * 1e3))
+        del z
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Cost of the write-ahead journal and time to recover a large queue from it.
+
+Submits --submits single jobs (one submit_jobs call each, as zsbatch does per
+job) and the same number in batches of --batch to an in-process zslurm
+manager, without and with a Journal, and reports the time per submitted job.
+Then fills a journaled manager with --jobs pending jobs, runs a few thousand
+of them on fake engines and finishes half of those, and times a fresh
+manager rebuilding everything: once from the journal alone and once after a
+compaction into snapshot.json.
+
+    python bench/journal.py [--submits 20000] [--batch 500] [--jobs 100000]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from _zslurm import load_zslurm
+
+
+def open_journal(z, path):
+    # what _open_journal does, minus the background thread
+    journal = z.Journal(path, z.jobs.finished_jobs_max)
+    state = journal.load()
+    z.engines.restore(state["engines"])
+    z.jobs.journal = journal
+    z.jobs.restore(state)
+    return journal, state
+
+
+def spec(i):
+    return dict(job_name="snakejob.bench.%d.sh" % i, cmd="true", cwd="/", env={"PATH": "/usr/bin"},
+                ncpu=1, mem=1000, reqtime=60, owner="bench", idempotency_key="bench-%d" % i)
+
+
+def submit_cost(path, njobs, batch):
+    z = load_zslurm()
+    if path:
+        open_journal(z, path)
+    t0 = time.perf_counter()
+    for first in range(0, njobs, batch):
+        z.jobs.submit_jobs([spec(i) for i in range(first, min(njobs, first + batch))])
+    return (time.perf_counter() - t0) / njobs
+
+
+def fill(path, njobs):
+    z = load_zslurm()
+    journal, _ = open_journal(z, path)
+    for first in range(0, njobs, 1000):
+        z.jobs.submit_jobs([spec(i) for i in range(first, min(njobs, first + 1000))])
+    running = []
+    for n in range(100):
+        myid = z.engines.register("bench-node-%d" % n, 32, 256000, "compute", str(1000 + n), 0, 0)
+        running.extend((myid, job[0]) for job in z.jobs.request_jobs(myid, 32, 256000, "compute"))
+    for myid, jobid in running[::2]:
+        z.jobs.job_finished(myid, jobid, 0, {})
+    journal.sync()
+    return z, journal
+
+
+def recover(path):
+    z = load_zslurm()
+    t0 = time.perf_counter()
+    journal, state = open_journal(z, path)
+    elapsed = time.perf_counter() - t0
+    return elapsed, len(z.jobs.jobs_by_id), journal.lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submits", type=int, default=20000, help="jobs submitted per submit-cost run")
+    parser.add_argument("--batch", type=int, default=500, help="jobs per submit_jobs call in batch runs")
+    parser.add_argument("--jobs", type=int, default=100000, help="queue size for the recovery runs")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="zslurm-journal-bench-")
+    try:
+        print("%-22s %14s %14s" % ("submit cost", "no journal", "journal"))
+        for batch in (1, args.batch):
+            costs = []
+            for journaled in (False, True):
+                path = os.path.join(tmp, "submit-%d" % batch) if journaled else None
+                costs.append(submit_cost(path, args.submits, batch))
+            print("%-22s %11.1f us %11.1f us" % ("batch of %d" % batch, costs[0] * 1e6, costs[1] * 1e6))
+
+        path = os.path.join(tmp, "queue")
+        z, journal = fill(path, args.jobs)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print("queue of %d jobs, %d running: journal %.1f MB" % (
+            len(z.jobs.jobs_by_id), sum(1 for job in z.jobs.jobs_by_id.values() if job.state == "RUNNING"), size / 1e6))
+        elapsed, restored, lines = recover(path)
+        print("recover from journal:  %6.2f s (%d jobs, %d records replayed)" % (elapsed, restored, lines))
+        t0 = time.perf_counter()
+        journal.compact()
+        compact = time.perf_counter() - t0
+        elapsed, restored, lines = recover(path)
+        print("compaction:            %6.2f s (snapshot %.1f MB)" % (
+            compact, os.path.getsize(os.path.join(path, "snapshot.json")) / 1e6))
+        print("recover from snapshot: %6.2f s (%d jobs, %d records replayed)" % (elapsed, restored, lines))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Engine RPC latency under heavy client polling.
+
+Starts an in-process zslurm manager (engine port + job port) holding --jobs
+pending jobs, lets --clients processes poll list_jobs/list_jobs_detailed/
+queue_stats on the job port as fast as they can, and meanwhile times an
+engine's poll() on the manager port and ping() on the job port. Runs once
+with the original one-request-at-a-time servers (rpc_workers=0) and once
+with the pooled servers (rpc_workers=--workers).
+
+    python bench/rpc_latency.py [--jobs 20000] [--clients 8] [--samples 200]
+"""
+import argparse
+import multiprocessing
+import socket
+import threading
+import time
+import xmlrpc.client
+
+from _zslurm import load_zslurm
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(("", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+URL = "http://127.0.0.1:%d/bench"
+
+
+def client(i, url, stop, served):
+    # separate processes, so the clients do not compete for the manager's GIL
+    proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    calls = (proxy.list_jobs, proxy.list_jobs_detailed, proxy.queue_stats)
+    n = 0
+    while not stop.is_set():
+        calls[(i + n) % len(calls)]()
+        n += 1
+    with served.get_lock():
+        served.value += n
+
+
+def run(z, workers, args, myid):
+    z.status.rpc_workers = workers
+    z.Servers.manager_server = z.Servers.job_server = None
+    port = free_port()
+    while True:
+        job_port = port + 1
+        try:
+            s = socket.socket()
+            s.bind(("", job_port))
+            s.close()
+            break
+        except OSError:
+            port = free_port()
+    threading.Thread(target=z.thread_start_manager_server, args=(port, "bench"), daemon=True).start()
+    threading.Thread(target=z.thread_start_job_server, args=(job_port, "bench"), daemon=True).start()
+    while z.Servers.manager_server is None or z.Servers.job_server is None:
+        time.sleep(0.01)
+
+    stop = multiprocessing.Event()
+    served = multiprocessing.Value("i", 0)
+    clients = [multiprocessing.Process(target=client, args=(i, URL % job_port, stop, served), daemon=True)
+               for i in range(args.clients)]
+    for t in clients:
+        t.start()
+    time.sleep(0.5)
+
+    engine = xmlrpc.client.ServerProxy(URL % port, allow_none=True)
+    jobport = xmlrpc.client.ServerProxy(URL % job_port, allow_none=True)
+    poll_ms, ping_ms = [], []
+    for _ in range(args.samples):
+        t0 = time.perf_counter()
+        engine.poll(myid, 0.0, 0.0, 0.0, z.zslurm_shared.RUNNING, 0.0, {}, {}, 0.0, 0.0, 0.0, 0.0)
+        t1 = time.perf_counter()
+        jobport.ping()
+        t2 = time.perf_counter()
+        poll_ms.append((t1 - t0) * 1000.0)
+        ping_ms.append((t2 - t1) * 1000.0)
+        time.sleep(args.interval)
+    stop.set()
+    for t in clients:
+        t.join()
+    z.Servers.manager_server.shutdown()
+    z.Servers.job_server.shutdown()
+    z.Servers.manager_server.server_close()
+    z.Servers.job_server.server_close()
+    return poll_ms, ping_ms, served.value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20000, help="pending jobs in the queue")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent polling clients")
+    parser.add_argument("--samples", type=int, default=200, help="engine poll() calls timed")
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between timed calls")
+    parser.add_argument("--workers", type=int, default=8, help="rpc_workers for the pooled run")
+    args = parser.parse_args()
+
+    z = load_zslurm()
+    for i in range(args.jobs):
+        z.jobs.submit_job("snakejob.bench.%d.sh" % i, "true", "/", {}, 1, 1000, 60, 0, None,
+                          0, 0, 0, 0, 0, 0, "compute", 0, "", "")
+    myid = z.engines.register("bench-engine", 64, 256000, "compute", "", 0, 0)
+
+    print("%d pending jobs, %d polling clients, %d samples" % (args.jobs, args.clients, args.samples))
+    print("%-10s %-6s %9s %9s %9s %9s %12s" % ("mode", "call", "p50 ms", "p95 ms", "p99 ms", "max ms", "client calls"))
+    for label, workers in (("serial", 0), ("pooled", args.workers)):
+        poll_ms, ping_ms, served = run(z, workers, args, myid)
+        for call, values in (("poll", poll_ms), ("ping", ping_ms)):
+            print("%-10s %-6s %9.2f %9.2f %9.2f %9.2f %12d" % (
+                label, call, percentile(values, 0.5), percentile(values, 0.95),
+                percentile(values, 0.99), max(values), served))
+
+
+if __name__ == "__main__":
+    main()
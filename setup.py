@@ -10,7 +10,7 @@ setup(
     version="0.1",
     scripts = ['zsqueue', 'zsbatch', 'zscancel','zslurm','zsnodes', 'zslurm_chief','slurm_to_zslurm','zsqueue_stats','zsoccupancy','zsstats','node_usage_viewer.py','zsstatus','zscontrol'],
     install_requires=['numpy>=1.4.1','psutil','dnspython', 'tabulate', 'PyYAML'],
-    extras_require={'ipyparallel': ['ipyparallel']},
+    extras_require={'ipyparallel': ['ipyparallel'], 'msgpack': ['msgpack']},
      py_modules=['zslurm_shared','zsb'],
      author = "M. Hulsman",
      author_email = "m.hulsman1@amsterdamumc.nl",
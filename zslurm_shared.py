@@ -3,9 +3,13 @@ import sys
 if sys.version_info.major == 2:
     import xmlrpclib
     import httplib
+    from SimpleXMLRPCServer import SimpleXMLRPCRequestHandler
+    from urlparse import urlsplit
 else:
     import xmlrpc.client as xmlrpclib
     import http.client as httplib
+    from xmlrpc.server import SimpleXMLRPCRequestHandler
+    from urllib.parse import urlsplit
 
 import copy
 import socket
@@ -21,6 +25,14 @@ import json
 import re
 import hashlib
 import subprocess
+import errno
+import gzip
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 
 DEFAULT_INSTANCE_NAME = "zslurm"
@@ -36,6 +48,12 @@ DIE = 2
 CANCEL = 3
 REREGISTER = 4
 DEASSIGN = 5
+RESYNC = 6  # send the next poll in full (delta polls, see POLL_DELTA_VERSION)
+CANCEL_JOBS = 7  # param: list of jobids; only sent to engines polling with version >= 2
+
+# poll(..., delta): version of the delta poll protocol
+# 2: the engine understands CANCEL_JOBS
+POLL_DELTA_VERSION = 2
 
 # MODES
 RUNNING = 1
@@ -55,33 +73,227 @@ def write_yaml_config(filename, config):
     return read_yaml_config(filename)
 
 
+# Compact wire encodings, negotiated per proxy: a client POSTs
+# {"method": ..., "params": [...]} with one of these content types and gets
+# {"result": ...} or {"fault": {"faultCode": ..., "faultString": ...}} back.
+# A server that does not know the content type answers as plain XML-RPC
+# (a parse fault in text/xml), and the client falls back to XML-RPC.
+WIRE_JSON = "application/x-zslurm-json"
+WIRE_MSGPACK = "application/x-zslurm-msgpack"
+GZIP_THRESHOLD = 1400  # bytes; same as SimpleXMLRPCRequestHandler.encode_threshold
+
+
+def wire_formats():
+    # best first
+    return ([WIRE_MSGPACK] if msgpack is not None else []) + [WIRE_JSON]
+
+
+def wire_dumps(ctype, obj):
+    if ctype == WIRE_MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def wire_loads(ctype, data):
+    if ctype == WIRE_MSGPACK:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data.decode("utf-8"))
+
+
+class CompactUnsupported(Exception):
+    pass
+
+
+class CompactRPCRequestHandler(SimpleXMLRPCRequestHandler):
+    """XML-RPC request handler that also serves the compact encodings
+    (WIRE_JSON, WIRE_MSGPACK), dispatching to the same registered functions."""
+
+    def do_POST(self):
+        ctype = self.headers.get("content-type", "")
+        if ctype not in wire_formats() or not self.is_rpc_path_valid():
+            return SimpleXMLRPCRequestHandler.do_POST(self)
+        try:
+            data = self.rfile.read(int(self.headers["content-length"]))
+            data = self.decode_request_content(data)
+            if data is None:
+                return  # response has been sent
+            call = wire_loads(ctype, data)
+            method, params = call["method"], call.get("params", [])
+        except Exception:
+            self.send_response(400)
+            self.send_header("Content-length", "0")
+            self.end_headers()
+            return
+        # servers may run some methods under a lock (see PooledXMLRPCServer)
+        run = getattr(self.server, "run_serialized", None)
+        if run is not None:
+            body = run(method, lambda: self._compact_call(ctype, method, params))
+        else:
+            body = self._compact_call(ctype, method, params)
+        self.send_response(200)
+        self.send_header("Content-type", ctype)
+        if len(body) > GZIP_THRESHOLD and "gzip" in self.accept_encodings():
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _compact_call(self, ctype, method, params):
+        try:
+            return wire_dumps(ctype, {"result": self.server._dispatch(method, params)})
+        except xmlrpclib.Fault as fault:
+            fault = {"faultCode": fault.faultCode, "faultString": fault.faultString}
+        except Exception:
+            exc_type, exc_value = sys.exc_info()[:2]
+            fault = {"faultCode": 1, "faultString": "%s:%s" % (exc_type, exc_value)}
+        return wire_dumps(ctype, {"fault": fault})
+
+    def log_error(self, format, *args):
+        # an idle keep-alive connection timing out is a normal close
+        if not format.startswith("Request timed out"):
+            SimpleXMLRPCRequestHandler.log_error(self, format, *args)
+
+
 class TimeoutHTTPConnection(httplib.HTTPConnection):
     def __init__(self, host, timeout=70):
         httplib.HTTPConnection.__init__(self, host, timeout=timeout)
 
 
 class TimeoutTransport(xmlrpclib.Transport):
+    """Transport with a timeout that keeps its HTTP connection open between
+    calls (if the server allows keep-alive) and can send compact requests."""
+
     def __init__(self, timeout=70, *l, **kw):
         xmlrpclib.Transport.__init__(self, *l, **kw)
         self.timeout = timeout
+        self.lock = threading.RLock()
 
     def make_connection(self, host):
-        conn = TimeoutHTTPConnection(host, self.timeout)
-        return conn
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        self._connection = host, TimeoutHTTPConnection(chost, self.timeout)
+        return self._connection[1]
+
+    def request(self, host, handler, request_body, verbose=False):
+        with self.lock:
+            return xmlrpclib.Transport.request(self, host, handler, request_body, verbose)
+
+    def compact_request(self, host, handler, ctype, methodname, params):
+        body = wire_dumps(ctype, {"method": methodname, "params": list(params)})
+        headers = {"Content-Type": ctype, "Accept-Encoding": "gzip"}
+        if len(body) > GZIP_THRESHOLD:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        with self.lock:
+            # retry once on a kept-alive connection the server has closed meanwhile
+            for attempt in (0, 1):
+                conn = self.make_connection(host)
+                try:
+                    conn.request("POST", handler, body, headers)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    break
+                except httplib.RemoteDisconnected:
+                    self.close()
+                    if attempt:
+                        raise
+                except (OSError, httplib.HTTPException) as e:
+                    self.close()
+                    if attempt or getattr(e, "errno", None) not in (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE):
+                        raise
+            if resp.will_close:
+                self.close()
+        if resp.status != 200 or resp.getheader("Content-Type", "") != ctype:
+            raise CompactUnsupported(resp.status)
+        if resp.getheader("Content-Encoding", "") == "gzip":
+            data = gzip.decompress(data)
+        reply = wire_loads(ctype, data)
+        if "fault" in reply:
+            fault = reply["fault"]
+            raise xmlrpclib.Fault(fault.get("faultCode", 1), fault.get("faultString", ""))
+        return reply.get("result")
 
 
 class TimeoutServerProxy(xmlrpclib.ServerProxy):
+    """ServerProxy with a timeout and connection reuse. Calls use the most
+    compact encoding the server accepts (wire='auto'), falling back to plain
+    XML-RPC for older managers; wire='xml' always uses XML-RPC."""
+
     def __init__(self, uri, timeout=70, *l, **kw):
-        kw["transport"] = TimeoutTransport(
+        wire = kw.pop("wire", "auto")
+        transport = TimeoutTransport(
             timeout=timeout, use_datetime=kw.get("use_datetime", 0)
         )
+        kw["transport"] = transport
         xmlrpclib.ServerProxy.__init__(self, uri, *l, **kw)
+        parts = urlsplit(uri)
+        self._zs_transport = transport
+        self._zs_host = parts.netloc
+        self._zs_handler = parts.path or "/RPC2"
+        if parts.query:
+            self._zs_handler += "?" + parts.query
+        self._zs_wire = list(wire_formats()) if wire == "auto" and parts.scheme == "http" else []
+
+    def _zs_request(self, methodname, params):
+        while self._zs_wire:
+            try:
+                return self._zs_transport.compact_request(
+                    self._zs_host, self._zs_handler, self._zs_wire[0], methodname, params)
+            except CompactUnsupported:
+                self._zs_wire.pop(0)
+        return self._ServerProxy__request(methodname, params)
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name.startswith("_zs_"):
+            raise AttributeError(name)
+        return xmlrpclib._Method(self._zs_request, name)
 
 
 # self register
 port = 38864
 address = "127.0.0.1"
 
+def env_key(env):
+    """Content hash of an environment dict; the manager interns environments
+    under it (put_env, submit_jobs env_base, get_envs)."""
+    return hashlib.sha1(json.dumps(env, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def env_diff(base, env):
+    """Changes that turn base into env: changed/new variables, removed ones as None."""
+    diff = dict((k, v) for k, v in env.items() if base.get(k) != v)
+    diff.update((k, None) for k in base if k not in env)
+    return diff
+
+
+def apply_env_diff(base, diff):
+    env = dict(base)
+    for k, v in diff.items():
+        if v is None:
+            env.pop(k, None)
+        else:
+            env[k] = v
+    return env
+
+
+RETRY_AFTER_RE = re.compile(r"retry after ([0-9.]+) s")
+
+
+def retry_after(fault):
+    """Seconds a refused submit (manager busy, see SubmitGate) asks the client
+    to wait, from the fault (or its faultString); None for any other fault."""
+    match = RETRY_AFTER_RE.search(str(getattr(fault, "faultString", fault)))
+    return float(match.group(1)) if match else None
+
+
+def busy_backoff(delay, attempt):
+    """Jittered wait before resubmitting after retry_after() gave delay: grows
+    with attempt so refused clients spread out instead of returning together."""
+    return min(300.0, delay * (1.0 + 0.5 * min(attempt, 4))) * random.uniform(1.0, 1.5)
+
+
 cache_hostname = None
 
 